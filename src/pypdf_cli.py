@@ -1,13 +1,34 @@
-from os import makedirs, scandir, getcwd
-from os.path import basename, dirname
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import filterfalse, repeat
+from mmap import mmap, ACCESS_READ
+from os import O_RDONLY, close, cpu_count, makedirs, open as os_open, replace, scandir, stat, getcwd, unlink
+from os.path import abspath, basename, dirname, exists, samefile
 
 import click
-from pypdf import PdfReader, PdfWriter
+from pypdf import PageObject, PdfReader, PdfWriter
 from pypdf.errors import PdfReadError
 
+# pypdf issues many small reads and writes per object and xref entry
+READ_BUFSIZE = 1 << 20
+WRITE_BUFSIZE = 1 << 20
+
+PDF_SUFFIX_RE = re.compile(r'\.pdf\Z', re.IGNORECASE)
+
 
 # auxiliary functions
 
+def validate_pdf_name(name):
+    """
+    Verify that a file name has a .pdf extension in any case.
+    """
+
+    if PDF_SUFFIX_RE.search(name) is None:
+        raise click.BadParameter(message='Only .pdf files allowed.')
+
+
 def generate_output_name(input_name, output_name, default):
     """
     Verify input/output file names and generate a default
@@ -15,18 +36,17 @@ def generate_output_name(input_name, output_name, default):
     """
 
     # verify input file
-    if not input_name.endswith('.pdf'):
-        raise click.BadParameter(message='Only .pdf files allowed.')
+    validate_pdf_name(input_name)
 
     # if output file was provided
     if output_name is not None:
 
         # verify output file
-        if not output_name.endswith('.pdf'):
-            raise click.BadParameter('Only .pdf files allowed.')
+        validate_pdf_name(output_name)
 
         # can't write output to input file because of PyPDF limitations
-        if output_name == input_name:
+        # also catch different paths to the same file
+        if output_name == input_name or (exists(output_name) and samefile(output_name, input_name)):
             raise click.BadParameter('Cannot output to input file.')
 
         return output_name
@@ -45,8 +65,10 @@ def validate_selection(selection, validation, non_empty=True):
         raise click.BadParameter(message='No pages selected.')
 
     # verify selection by provided function
-    if not all(map(validation, selection)):
-        raise click.BadParameter(message=f'Invalid selection: {sorted([s + 1 for s in selection])!r}')
+    # report the first invalid page instead of the whole selection
+    invalid = next(filterfalse(validation, selection), None)
+    if invalid is not None:
+        raise click.BadParameter(message=f'Invalid selection: page {invalid + 1} out of range.')
 
     return selection
 
@@ -63,37 +85,107 @@ def validate_index(num_pages, lshift=0, rshift=0):
         raise IndexError('Index shift must be within the range of existing pages and allow at least 1 selection.')
 
     # create validation function
-    def f(x):
-        return 0 + lshift <= x < num_pages - rshift
+    # membership of a range is checked in C without a python frame per index
+    return range(lshift, num_pages - rshift).__contains__
 
-    return f
+
+def open_pdf(path):
+    """
+    Memory map a pdf file for reading.
+    The parser's many seeks and reads become memory accesses instead of syscalls.
+    Fall back to a large read buffer for files that cannot be mapped.
+    """
+
+    fd = os_open(path, O_RDONLY)
+    try:
+        return mmap(fd, 0, access=ACCESS_READ)
+    except (ValueError, OSError):
+        # empty files and special files like pipes
+        return open(path, 'rb', buffering=READ_BUFSIZE)
+    finally:
+        close(fd)
 
 
-def buffer_number(max_digits, k):
+@lru_cache(maxsize=8)
+def cached_reader(path, inode, mtime, size):
     """
-    Utility to buffer zeroes in front of a number
-    according to the maximum amount of digits.
+    Parse a pdf file once per location and file state.
+    Cached readers keep their stream open, so it must not be closed.
     """
 
-    k = str(k)
-    return '0' * (max_digits - len(k)) + k
+    stream = open_pdf(path)
+    try:
+        return PdfReader(stream)
+    except BaseException:
+        # a rejected file is not cached, so nothing else would close its stream
+        stream.close()
+        raise
+
+
+def read_pdf(path):
+    """
+    Get a reader for a pdf file. Reuses the reader of a previous
+    call as long as the file has not been modified since.
+    """
+
+    stat_result = stat(path)
+    return cached_reader(abspath(path), stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
 
 
 def write(writer, output):
     """
     Write content to a specified output.
     Create directories if necessary.
-    Overwrites existing files.
+    Overwrites existing files atomically.
     """
 
-    # create directories if necessary
-    dirs = dirname(output)
-    if len(dirs) > 0:
+    # write output to a temporary file and move it into place
+    # so an interrupted write never leaves a corrupted output
+    tmp = output + '.tmp'
+
+    # create directories only if they are missing
+    # saves the syscalls for every output of a split into the same directory
+    try:
+        f = open(tmp, 'wb', buffering=WRITE_BUFSIZE)
+    except FileNotFoundError:
+        dirs = dirname(output)
+        if len(dirs) == 0:
+            raise
         makedirs(dirs, exist_ok=True)
+        f = open(tmp, 'wb', buffering=WRITE_BUFSIZE)
+
+    try:
+        with f:
+            writer.write(f)
+        replace(tmp, output)
+    except BaseException:
+        unlink(tmp)
+        raise
 
-    # write output
-    with open(output, 'wb') as f:
-        writer.write(f)
+
+def get_max_workers(n_tasks):
+    """
+    Number of worker processes for a number of tasks.
+    Limited to the cpus this process may run on where the platform tells.
+    """
+
+    try:
+        from os import sched_getaffinity
+        n_cpus = len(sched_getaffinity(0))
+    except ImportError:
+        n_cpus = cpu_count() or 1
+    return max(1, min(n_cpus, n_tasks))
+
+
+def write_split(input_file, pages, output):
+    """
+    Write a (start, stop) range of pages of a pdf file to an output.
+    Lives on module level so worker processes can run it.
+    """
+
+    writer = PdfWriter()
+    writer.append(read_pdf(input_file), pages=pages)
+    write(writer, output)
 
 
 # click functions
@@ -107,25 +199,30 @@ def cli():
 # Make custom Option classes to parse input
 # Decrement user indices to match PyPDF indices
 
+# one entry of a selection, either a page or a range of pages,
+# followed by a comma and another entry or the end of the selection
+PAGES_RE = re.compile(r'\s*(\d+)(?:\s*-\s*(\d+))?\s*(?:,(?=\s*\d)|\Z)')
+
+
 class PagesType(click.ParamType):
     
     name = "INT PAGES"
 
     def convert(self, value, param, ctx):
 
-        try:
-            selection = set()
-            for c_split in value.replace(' ', '').split(','):
-                if '-' in c_split:
-                    r_split = c_split.split('-')
-                    assert len(r_split) == 2
-                    selection.update(range(int(r_split[0]) - 1, int(r_split[1])))
-                else:
-                    selection.add(int(c_split) - 1)
-        except (ValueError, AssertionError):
-            self.fail(f'{value!r} is not a valid selection of integers. Use as 1,3-5,7.', param, ctx)
+        # entries must follow each other without gaps
+        ranges = []
+        pos = 0
+        while pos == 0 or pos < len(value):
+            match = PAGES_RE.match(value, pos)
+            if match is None:
+                self.fail(f'{value!r} is not a valid selection of integers. Use as 1,3-5,7.', param, ctx)
+            start, stop = match.groups()
+            ranges.append(range(int(start) - 1, int(stop or start)))
+            pos = match.end()
 
-        return selection
+        # union all entries at once
+        return set().union(*ranges)
 
 
 class SortByType(click.ParamType):
@@ -149,14 +246,21 @@ ALL_HELP = 'Select every index.'
 SORT_BY_HELP = 'Sort input files by NAME or DATE (last modified) when selecting all files.'
 
 
+# build commonly used click Options once and share them between commands
+COMMON_PARAMS = [
+    click.Argument(['input-file'], type=click.Path(exists=True)),
+    click.Option(['--output', '-o'], type=click.Path(dir_okay=True), help=OUTPUT_HELP),
+    click.Option(['--select-pages', '-p'], type=INT_PAGES, multiple=False, help=PAGES_MULTI_HELP),
+]
+
+
 def common_options(f):
     """
     Collect commonly used click Options.
+    Attached the way click's own decorators do, so click.command picks them up.
     """
 
-    f = click.argument('input-file', type=click.Path(exists=True))(f)
-    f = click.option('--output', '-o', type=click.Path(dir_okay=True), help=OUTPUT_HELP)(f)
-    f = click.option('--select-pages', '-p', type=INT_PAGES, multiple=False, help=PAGES_MULTI_HELP)(f)
+    f.__click_params__ = getattr(f, '__click_params__', []) + COMMON_PARAMS
     return f
 
 
@@ -173,23 +277,22 @@ def delete(input_file, output, select_pages):
 
     # configure and verify
     output = generate_output_name(input_file, output, 'deleted')
-    reader = PdfReader(open(input_file, 'rb'))
-    selection = validate_selection(select_pages, validate_index(len(reader.pages)))
+    reader = read_pdf(input_file)
+    n_pages = len(reader.pages)
+    selection = validate_selection(select_pages, validate_index(n_pages))
     writer = PdfWriter()
 
     # specific verification
-    retain = [i for i in range(len(reader.pages)) if i not in selection]
+    # set difference runs in C instead of a python loop over every page
+    retain = sorted(set(range(n_pages)).difference(selection))
     if len(retain) == 0:
-        reader.stream.close()
         raise click.BadParameter(message='Cannot delete all pages.')
 
     # build output
-    for i in retain:
-        writer.add_page(reader.pages[i])
+    writer.append(reader, pages=retain)
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 @click.command()
@@ -204,24 +307,22 @@ def extract(input_file, output, select_pages):
     # configure and verify
     output = generate_output_name(input_file, output, 'extracted')
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
-    selection = validate_selection(select_pages, validate_index(len(reader.pages)))
+    n_pages = len(reader.pages)
+    selection = validate_selection(select_pages, validate_index(n_pages))
     writer = PdfWriter()
 
     # specific verification
-    if len(selection) == len(reader.pages):
-        reader.stream.close()
+    if len(selection) == n_pages:
         raise click.BadParameter(message='Cannot extract all pages.')
 
     # build output
-    for i in selection:
-        writer.add_page(reader.pages[i])
+    writer.append(reader, pages=sorted(selection))
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 @click.command()
@@ -240,26 +341,22 @@ def insert(input_files, output, select_pages):
     # configure and verify
     output = generate_output_name(input_files[0], output, 'inserted')
     try:
-        reader1 = PdfReader(open(input_files[0], 'rb'))
-        reader2 = PdfReader(open(input_files[1], 'rb'))
+        reader1 = read_pdf(input_files[0])
+        reader2 = read_pdf(input_files[1])
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
-    selection = validate_selection(select_pages, validate_index(len(reader1.pages)))
+    n_pages1 = len(reader1.pages)
+    selection = validate_selection(select_pages, validate_index(n_pages1))
     index = selection.pop()
     writer = PdfWriter()
 
     # build output
-    for i in range(0, index):
-        writer.add_page(reader1.pages[i])
-    for page in reader2.pages:
-        writer.add_page(page)
-    for i in range(index, len(reader1.pages)):
-        writer.add_page(reader1.pages[i])
+    writer.append(reader1, pages=(0, index))
+    writer.append(reader2)
+    writer.append(reader1, pages=(index, n_pages1))
 
     # finalize
     write(writer, output)
-    reader1.stream.close()
-    reader2.stream.close()
 
 
 @click.command()
@@ -267,10 +364,14 @@ def insert(input_files, output, select_pages):
 @click.option('--output', '-o', type=click.Path(), help=OUTPUT_HELP)
 @click.option('--all', '-a', is_flag=True, default=False, help=ALL_HELP)
 @click.option('--sort', '-s', type=SORT_BY, default='NAME', help=SORT_BY_HELP)
-def merge(input_files, output, all, sort):
+@click.option('--pages-only', is_flag=True, default=False,
+              help='Whether to merge only the pages and drop outlines and annotations. Faster, but loses links, '
+                   'form fields, and comments.')
+def merge(input_files, output, all, sort, pages_only):
     """
     Merge two or more pdf files.
     Files are appended in the order they are entered.
+    Use --pages-only to drop outlines and annotations for a faster merge.
 
     INPUT_FILES are the locations of at least two pdf files to be merged.
     Merge all files in the current directory if no input is given.
@@ -278,36 +379,42 @@ def merge(input_files, output, all, sort):
 
     # if no input files are specified or 'all' flag is set,
     # take all pdf files in current directory
+    # directory entries cache their stat results for sorting by date
     if len(input_files) == 0 or all:
         with scandir(getcwd()) as scanner:
-            input_files = [f for f in scanner if f.name.endswith('.pdf')]
+            entries = [e for e in scanner if e.is_file() and e.name.lower().endswith('.pdf')]
 
-    if sort == 'DATE':
-        input_files.sort(key=lambda f: float(f.stat().st_mtime))
-    else: # default NAME
-        input_files.sort(key=lambda f: f.name)
+        if sort == 'DATE':
+            entries.sort(key=lambda e: e.stat().st_mtime)
+        else: # default NAME
+            entries.sort(key=lambda e: e.name)
 
-    input_files = [f.name for f in input_files]
+        input_files = [e.name for e in entries]
 
     # specific verification
     if len(input_files) < 2:
         raise click.BadParameter(message='Cannot merge less than two files.')
 
     # configure
+    # close writer and thread pool on every exit path
     output = generate_output_name(input_files[0], output, 'merged')
-    writer = PdfWriter()
+    with ExitStack() as stack:
+        writer = PdfWriter()
+        stack.callback(writer.close)
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=min(8, len(input_files))))
 
-    # build output
-    for file in input_files:
+        # build output
+        # parse files concurrently while they are appended in order
+        # pages only skips outline and annotation processing of pure page concatenation
+        append_options = dict(import_outline=False, excluded_fields=['/Annots']) if pages_only else {}
         try:
-            writer.append(open(file, 'rb'))
+            for reader in executor.map(read_pdf, input_files):
+                writer.append(reader, **append_options)
         except PdfReadError:
-            writer.close()
             raise click.BadParameter('File cannot be read.')
 
-    # finalize
-    write(writer, output)
-    writer.close()
+        # finalize
+        write(writer, output)
 
 
 @click.command()
@@ -328,52 +435,47 @@ def split(input_file, output, select_pages, all):
     output = generate_output_name(input_file, output, 'split')
     output = output[:-4] + '_'
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
+    n_pages = len(reader.pages)
 
     # specific verification
-    if len(reader.pages) < 2:
-        reader.stream.close()
+    if n_pages < 2:
         raise click.BadParameter(message="Cannot split a file with less than two pages.")
 
-    # if 'all' flag is set split at every index
-    # requires selection to be a sorted list
+    # if 'all' flag is set every page becomes its own output
+    # and no selection needs to be sorted into ranges
     if all:
-        selection = list(range(len(reader.pages) - 1))
+        n_outputs = n_pages
+        ranges = zip(range(n_pages), range(1, n_pages + 1))
     else:
-        selection = validate_selection(select_pages, validate_index(len(reader.pages), rshift=1))
-        selection = sorted(list(selection))
-
-    # calculate splits that will make up the outputs
-    splits = []
-    for i, sel in enumerate(selection):
-        # indices are inclusive so shift by 1
-        # build range from previous selection to current selection
-        splits.append(list(
-            range(0, sel + 1) if i == 0 else
-            range(selection[i - 1] + 1, sel + 1))
-        )
-
-    # include pages from last selection to end of pages
-    splits.append(list(range(selection[-1] + 1, len(reader.pages))))
-    reader.stream.close()
+        selection = validate_selection(select_pages, validate_index(n_pages, rshift=1))
+        n_outputs = len(selection) + 1
+
+        # calculate page ranges that will make up the outputs
+        # a range ends AFTER every selected index
+        ranges = []
+        start = 0
+        for sel in sorted(selection):
+            ranges.append((start, sel + 1))
+            start = sel + 1
+        ranges.append((start, n_pages))
 
     # track number of splits for output names
-    max_digits = len(str(len(selection)))
-    k = 1
+    max_digits = len(str(n_outputs))
+    outputs = (f'{output}{k:0{max_digits}d}.pdf' for k in range(1, n_outputs + 1))
 
     # build outputs
-    # recreate reader for each writer because of a PyPDF bug
-    # https://stackoverflow.com/questions/40168027
-    for pages in splits:
-        writer = PdfWriter()
-        reader = PdfReader(open(input_file, 'rb'))
-        for p in pages:
-            writer.add_page(reader.pages[p])
-        write(writer, output + buffer_number(max_digits, k) + '.pdf')
-        k += 1
-        reader.stream.close()
+    # serializing outputs is cpu bound, so spread it across processes
+    # forked workers inherit the cached reader, spawned ones parse the input once each
+    max_workers = get_max_workers(n_outputs)
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(write_split, repeat(input_file), ranges, outputs))
+    else:
+        for pages, out in zip(ranges, outputs):
+            write_split(input_file, pages, out)
 
 
 @click.command()
@@ -397,23 +499,21 @@ def encrypt(input_file, output, user_password, owner_password, use_40bit):
     # configure and verify
     output = generate_output_name(input_file, output, 'encrypted')
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
     writer = PdfWriter()
 
     # specific verification
     if reader.is_encrypted:
-        reader.stream.close()
         raise click.BadArgumentUsage(message='File is already encrypted.')
 
     # build output
-    writer.append_pages_from_reader(reader)
+    writer.clone_reader_document_root(reader)
     writer.encrypt(user_password=user_password, owner_password=owner_password, use_128bit=not use_40bit)
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 @click.command()
@@ -429,28 +529,29 @@ def decrypt(input_file, output, password):
 
     # configure and verify
     output = generate_output_name(input_file, output, 'decrypted')
-    try:
-        reader = PdfReader(open(input_file, 'rb'))
-    except PdfReadError:
-        raise click.BadParameter('File cannot be read.')
-    writer = PdfWriter()
 
-    # specific verification
-    if not reader.is_encrypted:
-        reader.stream.close()
-        raise click.BadArgumentUsage(message='File is not encrypted.')
+    # decrypting changes the reader, so use a private one instead of the cached reader
+    # otherwise later reads of the same file would get the decrypted content without a password
+    with open_pdf(input_file) as stream:
+        try:
+            reader = PdfReader(stream)
+        except PdfReadError:
+            raise click.BadParameter('File cannot be read.')
+        writer = PdfWriter()
 
-    # build output
-    success = reader.decrypt(password) > 0
-    if success:
-        writer.append_pages_from_reader(reader)
-    else:
-        reader.stream.close()
-        raise click.BadParameter(message='Wrong password.')
+        # specific verification
+        if not reader.is_encrypted:
+            raise click.BadArgumentUsage(message='File is not encrypted.')
 
-    # finalize
-    write(writer, output)
-    reader.stream.close()
+        # build output
+        success = reader.decrypt(password) > 0
+        if success:
+            writer.clone_reader_document_root(reader)
+        else:
+            raise click.BadParameter(message='Wrong password.')
+
+        # finalize
+        write(writer, output)
 
 
 @click.command()
@@ -468,19 +569,16 @@ def remove(input_file, output, images, links, text):
 
     # configure and verify
     output = generate_output_name(input_file, output, 'removed')
+    if not any([images, links, text]):
+        raise click.BadParameter(message='No objects to remove specified.')
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
     writer = PdfWriter()
 
-    # specific verification
-    if not any([images, links, text]):
-        reader.stream.close()
-        raise click.BadParameter(message='No objects to remove specified.')
-
     # build output
-    writer.append_pages_from_reader(reader)
+    writer.clone_reader_document_root(reader)
     if images:
         writer.remove_images()
     if links:
@@ -490,7 +588,6 @@ def remove(input_file, output, images, links, text):
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 @click.command()
@@ -503,9 +600,9 @@ def info(input_file):
     """
 
     # configure and verify
-    generate_output_name(input_file, None, 'info')
+    validate_pdf_name(input_file)
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
 
@@ -513,9 +610,6 @@ def info(input_file):
     for k, v in reader.metadata.items():
         click.echo(f'{k}: {v}')
 
-    # finalize
-    reader.stream.close()
-
 
 @click.command()
 @click.argument('input-file', type=click.Path(exists=True))
@@ -530,18 +624,17 @@ def reverse(input_file, output):
     # configure and verify
     output = generate_output_name(input_file, output, 'reversed')
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
     writer = PdfWriter()
 
     # build output
-    for i in reversed(list(range(len(reader.pages)))):
-        writer.add_page(reader.pages[i])
+    n_pages = len(reader.pages)
+    writer.append(reader, pages=(n_pages - 1, -1, -1))
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 @click.command()
@@ -558,31 +651,32 @@ def rotate(input_file, output, select_pages, all, angle):
 
     # configure and verify
     output = generate_output_name(input_file, output, 'rotated')
+    if angle % 90 != 0:
+        raise click.BadParameter('Rotation angle must be increment of 90.')
+
+    angle %= 360
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
     writer = PdfWriter()
 
-    # if 'all' flag is set rotate every page
-    if all:
-        selection = set(range(len(reader.pages)))
-    else:
+    # if 'all' flag is set rotate every page without building a selection
+    if not all:
         selection = validate_selection(select_pages, validate_index(len(reader.pages)))
 
-    # specific verification
-    if angle % 90 != 0:
-        reader.stream.close()
-        raise click.BadParameter('Rotation angle must be increment of 90.')
-
     # build output
-    writer.append_pages_from_reader(reader)
-    for i in selection:
-        writer.pages[i].rotate(angle)
+    # full turns leave every page as is, but the output is still written
+    writer.clone_reader_document_root(reader)
+    if angle == 0:
+        click.echo('No-op rotation, pages are written unchanged.')
+    else:
+        pages = writer.pages
+        for page in (pages if all else (pages[i] for i in selection)):
+            page.rotate(angle)
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 @click.command()
@@ -605,28 +699,24 @@ def scale(input_file, output, select_pages, all, scale_to, horizontal, vertical)
     # configure and verify
     output = generate_output_name(input_file, output, 'scaled')
     try:
-        reader = PdfReader(open(input_file, 'rb'))
+        reader = read_pdf(input_file)
     except PdfReadError:
         raise click.BadParameter('File cannot be read.')
     writer = PdfWriter()
 
-    # if 'all' flag is set rotate every page
-    if all:
-        selection = set(range(len(reader.pages)))
-    else:
+    # if 'all' flag is set scale every page without building a selection
+    if not all:
         selection = validate_selection(select_pages, validate_index(len(reader.pages)))
 
     # build output
-    writer.append_pages_from_reader(reader)
-    for i in selection:
-        if scale_to:
-            writer.pages[i].scale_to(horizontal, vertical)
-        else:
-            writer.pages[i].scale(horizontal, vertical)
+    writer.clone_reader_document_root(reader)
+    pages = writer.pages
+    scale_page = PageObject.scale_to if scale_to else PageObject.scale
+    for page in (pages if all else (pages[i] for i in selection)):
+        scale_page(page, horizontal, vertical)
 
     # finalize
     write(writer, output)
-    reader.stream.close()
 
 
 # finalize commands
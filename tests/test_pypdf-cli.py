@@ -1,7 +1,10 @@
+import re
+from io import BytesIO
 from os.path import abspath, join
 
 import pytest
 from click.testing import CliRunner
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
 
 from pypdf_cli import *
 
@@ -9,312 +12,349 @@ TEST_DIR = dirname(abspath(__file__))
 TEST_FILE = join(TEST_DIR, 'file.pdf')
 
 RUNNER = CliRunner()
-TEST_OUT = join(TEST_DIR, 'test.pdf')
 
+# suffixes of the outputs of splitting the test file at every page
+SPLIT_NAMES = tuple(f'{i:02d}' for i in range(1, 13))
 
-def test_generate_output_name():
-    with pytest.raises(click.BadParameter):
-        generate_output_name('missing extension', 'missing extension', 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('missing extension', None, 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('correct.pdf', 'missing extension', 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('missing extension', 'correct.pdf', 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('wrong extension.txt', 'wrong extension.txt', 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('wrong extension.txt', None, 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('correct.pdf', 'wrong extension.txt', 'default')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('wrong extension.txt', 'correct.pdf', '')
-    with pytest.raises(click.BadParameter):
-        generate_output_name('same name.pdf', 'same name.pdf', '')
 
-    assert generate_output_name('input.pdf', 'output.pdf', 'default') == 'output.pdf'
-    assert generate_output_name('in put.pdf', 'out put.pdf', 'default') == 'out put.pdf'
-    assert generate_output_name('dir/in put.pdf', 'output.pdf', 'default') == 'output.pdf'
-    assert generate_output_name('dir/in put.pdf', None, 'default') == 'in put_default.pdf'
-    assert generate_output_name('dir/in put.pdf', None, '') == 'in put_.pdf'
+@pytest.fixture
+def test_out(tmp_path):
+    return str(tmp_path / 'test.pdf')
 
 
-def test_validate_selection():
-    def true(_):
-        return True
+def read_out(path):
+    """
+    Parse an output file without keeping its file handle open.
+    """
 
-    def false(_):
-        return False
+    with open(path, 'rb') as f:
+        return PdfReader(BytesIO(f.read()))
 
-    def even(x):
-        return x % 2 == 0
 
+# the test file shows its page label as a literal string, e.g. [(page1)]TJ
+LABEL_RE = re.compile(rb'\((page\d+)\)')
+
+def first_token(page):
+    """
+    Get the leading text token of a page, e.g. 'page1'.
+    Scans the decoded content stream instead of running text extraction.
+    """
+
+    return LABEL_RE.search(page.get_contents().get_data()).group(1).decode()
+
+
+def labels(reader):
+    """
+    Get the leading label of every page, e.g. 'page1'.
+    """
+
+    return [first_token(page) for page in reader.pages]
+
+
+def angle_of(page):
+    rotate_obj = page.get('/Rotate', 0)
+    return rotate_obj if isinstance(rotate_obj, int) else rotate_obj.get_object()
+
+
+def angles(reader):
+    return list(map(angle_of, reader.pages))
+
+
+def page_names(numbers):
+    return [f'page{n}' for n in numbers]
+
+
+def run(cmd, **kwargs):
+    """
+    Call a command's callback directly, skipping click's argv parsing.
+    Parameters that are not passed default to False for flags and None otherwise.
+    """
+
+    params = {param.name: False if getattr(param, 'is_flag', False) else None for param in cmd.params}
+    params.update(kwargs)
+    return cmd.callback(**params)
+
+
+def exit_code(cmd, argv):
+    """
+    Parse argv and run a command without click's output capture and exit handling.
+    Usage errors such as a BadParameter map to exit code 2 like on the command line.
+    """
+
+    try:
+        cmd.main(argv, standalone_mode=False)
+    except click.UsageError:
+        return 2
+    return 0
+
+
+def run_expect_error(cmd, argv):
+    assert exit_code(cmd, argv) == 2
+
+
+def test_validate_pdf_name():
     with pytest.raises(click.BadParameter):
-        validate_selection(set(), true)
-    with pytest.raises(click.BadParameter):
-        validate_selection(set(), false)
-    with pytest.raises(click.BadParameter):
-        validate_selection({1}, false)
+        validate_pdf_name('missing extension')
     with pytest.raises(click.BadParameter):
-        validate_selection({1, 2, 3}, even)
+        validate_pdf_name('wrong extension.txt')
+
+    validate_pdf_name('correct.pdf')
+    validate_pdf_name('CORRECT.PDF')
+
+
+@pytest.mark.parametrize('input_name,output_name,default', [
+    ('missing extension', 'missing extension', 'default'),
+    ('missing extension', None, 'default'),
+    ('correct.pdf', 'missing extension', 'default'),
+    ('missing extension', 'correct.pdf', 'default'),
+    ('wrong extension.txt', 'wrong extension.txt', 'default'),
+    ('wrong extension.txt', None, 'default'),
+    ('correct.pdf', 'wrong extension.txt', 'default'),
+    ('wrong extension.txt', 'correct.pdf', ''),
+    ('same name.pdf', 'same name.pdf', ''),
+    (TEST_FILE, join(TEST_DIR, '..', 'tests', 'file.pdf'), ''),
+])
+def test_generate_output_name_bad(input_name, output_name, default):
     with pytest.raises(click.BadParameter):
-        validate_selection(set(), even)
+        generate_output_name(input_name, output_name, default)
 
-    try: 
-        validate_selection(set(), true, non_empty=False)
-        validate_selection({1}, true)
-        validate_selection({1, 2}, true)
-        validate_selection({2}, even)
-        validate_selection({2, 4}, even)
-    except click.BadParameter:
-        pytest.fail("Unexpect BadParameter Error")
 
+@pytest.mark.parametrize('input_name,output_name,default,expected', [
+    ('input.pdf', 'output.pdf', 'default', 'output.pdf'),
+    ('in put.pdf', 'out put.pdf', 'default', 'out put.pdf'),
+    ('dir/in put.pdf', 'output.pdf', 'default', 'output.pdf'),
+    ('dir/in put.pdf', None, 'default', 'in put_default.pdf'),
+    ('dir/in put.pdf', None, '', 'in put_.pdf'),
+    ('INPUT.PDF', 'output.Pdf', 'default', 'output.Pdf'),
+    ('dir/INPUT.PDF', None, 'default', 'INPUT_default.pdf'),
+])
+def test_generate_output_name_good(input_name, output_name, default, expected):
+    assert generate_output_name(input_name, output_name, default) == expected
 
-def test_validate_index():
-    num_pages = 10
-    pages = list(range(num_pages))
 
-    with pytest.raises(IndexError):
-        validate_index(num_pages, rshift=-1)
-    with pytest.raises(IndexError):
-        validate_index(num_pages, lshift=-1)
-    with pytest.raises(IndexError):
-        validate_index(num_pages, lshift=10)
-    with pytest.raises(IndexError):
-        validate_index(num_pages, lshift=5, rshift=5)
+def true(_):
+    return True
+
 
-    f = validate_index(num_pages)
-    assert all(f(page) for page in pages)
+def false(_):
+    return False
 
-    f = validate_index(num_pages, lshift=1)
-    assert all(f(page) for page in pages[1:])
-    assert not f(0)
 
-    f = validate_index(num_pages, rshift=1)
-    assert all(f(page) for page in pages[:-1])
-    assert not f(9)
+def even(x):
+    return x % 2 == 0
 
-    f = validate_index(num_pages, lshift=1, rshift=1)
-    assert all(f(page) for page in pages[1:-1])
-    assert not f(0)
-    assert not f(9)
 
-    f = validate_index(num_pages, lshift=4, rshift=5)
-    assert not any(f(page) for page in pages if page != 4)
-    assert f(4)
+@pytest.mark.parametrize('selection,validation', [
+    (set(), true),
+    (set(), false),
+    ({1}, false),
+    ({1, 2, 3}, even),
+    (set(), even),
+])
+def test_validate_selection_bad(selection, validation):
+    with pytest.raises(click.BadParameter):
+        validate_selection(selection, validation)
 
-    f = validate_index(num_pages, rshift=9)
-    assert not any(f(page) for page in pages[1:])
-    assert f(0)
 
+@pytest.mark.parametrize('selection,validation,non_empty', [
+    (set(), true, False),
+    ({1}, true, True),
+    ({1, 2}, true, True),
+    ({2}, even, True),
+    ({2, 4}, even, True),
+])
+def test_validate_selection_good(selection, validation, non_empty):
+    assert validate_selection(selection, validation, non_empty=non_empty) == selection
 
-def test_buffer_number():
-    assert buffer_number(1, 1) == '1'
-    assert buffer_number(2, 1) == '01'
-    assert buffer_number(3, 1) == '001'
-    assert buffer_number(0, 1) == '1'
 
+NUM_PAGES = 10
+PAGES = list(range(NUM_PAGES))
 
-def test_convert_pages():
+
+@pytest.mark.parametrize('lshift,rshift', [(0, -1), (-1, 0), (10, 0), (5, 5)])
+def test_validate_index_bad(lshift, rshift):
+    with pytest.raises(IndexError):
+        validate_index(NUM_PAGES, lshift=lshift, rshift=rshift)
+
+
+@pytest.mark.parametrize('lshift,rshift,valid', [
+    (0, 0, set(PAGES)),
+    (1, 0, set(PAGES[1:])),
+    (0, 1, set(PAGES[:-1])),
+    (1, 1, set(PAGES[1:-1])),
+    (4, 5, {4}),
+    (0, 9, {0}),
+])
+def test_validate_index_good(lshift, rshift, valid):
+    f = validate_index(NUM_PAGES, lshift=lshift, rshift=rshift)
+    assert {page for page in PAGES if f(page)} == valid
+
+
+def test_read_pdf():
+    reader = read_pdf(TEST_FILE)
+    assert len(reader.pages) == 12
+    assert read_pdf(TEST_FILE) is reader
+
+
+# unclosed streams of rejected files surface as warnings
+@pytest.mark.filterwarnings('error')
+def test_open_pdf(tmp_path):
+    empty = tmp_path / 'empty.pdf'
+    empty.write_bytes(b'')
+    with open_pdf(str(empty)) as f:
+        assert f.read() == b''
+    with pytest.raises(PdfReadError):
+        read_pdf(str(empty))
+
+    run_expect_error(info, [str(empty)])
+
+
+def test_get_max_workers():
+    assert get_max_workers(0) == 1
+    assert get_max_workers(1) == 1
+    assert 1 <= get_max_workers(1000) <= 1000
+
+
+def test_write(tmp_path):
+    writer = PdfWriter()
+    writer.add_blank_page(100, 100)
+
+    output = tmp_path / 'new' / 'dirs' / 'out.pdf'
+    write(writer, str(output))
+    assert len(read_out(str(output)).pages) == 1
+    assert not (tmp_path / 'new' / 'dirs' / 'out.pdf.tmp').exists()
+
+    write(writer, str(output))
+    assert len(read_out(str(output)).pages) == 1
+
+    # an output that cannot be replaced leaves no temporary file behind
+    directory = tmp_path / 'directory.pdf'
+    directory.mkdir()
+    with pytest.raises(OSError):
+        write(writer, str(directory))
+    assert not (tmp_path / 'directory.pdf.tmp').exists()
+
+
+@pytest.mark.parametrize('value,code', [
+    # code 0 -> okay
+    # code 2 -> error raised
+    (None, 2),
+    ('1,', 2),
+    ('1,a', 2),
+    ('1,2.0', 2),
+    ('1-', 2),
+    ('1-a', 2),
+    ('1-2.0', 2),
+    ('1-2-3', 2),
+    ('1,2-a', 2),
+    ('1,2-', 2),
+    ('1', 0),
+    ('1,2,3', 0),
+    ('1-2', 0),
+    ('1-2,4-5', 0),
+    ('1,3-5', 0),
+    ('1-3,5', 0),
+    ('1,3-5,7', 0),
+    ('1-3,5,7-9', 0),
+    (' 1 - 3 , 5 ', 0),
+])
+def test_convert_pages(value, code, test_out):
+    argv = [TEST_FILE, '-o', test_out] + (['-p', value] if value is not None else [])
+    assert exit_code(delete, argv) == code
+
+
+def test_delete(test_out):
     # result.exit_code = 0 -> okay
     # result.exit_code = 2 -> error raised
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT])
-    assert result.exit_code == 2
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,'])
-    assert result.exit_code == 2
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,a'])
-    assert result.exit_code == 2
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2.0'])
-    assert result.exit_code == 2
+    run(delete, input_file=TEST_FILE, output=test_out, select_pages={0})
+    assert labels(read_out(test_out)) == page_names(range(2, 13))
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-'])
-    assert result.exit_code == 2
+    run(delete, input_file=TEST_FILE, output=test_out, select_pages={0, 1, 2, 3})
+    assert labels(read_out(test_out)) == page_names(range(5, 13))
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-a'])
-    assert result.exit_code == 2
+    run(delete, input_file=TEST_FILE, output=test_out, select_pages={9, 10, 11})
+    assert labels(read_out(test_out)) == page_names(range(1, 10))
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-2.0'])
-    assert result.exit_code == 2
+    run(delete, input_file=TEST_FILE, output=test_out, select_pages={0, 1, 2, 3, 9, 10, 11})
+    assert labels(read_out(test_out)) == page_names(range(5, 10))
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-2-3'])
-    assert result.exit_code == 2
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2-a'])
-    assert result.exit_code == 2
+    run(delete, input_file=TEST_FILE, output=test_out, select_pages={4, 5, 6, 7, 8, 9})
+    assert labels(read_out(test_out)) == page_names([1, 2, 3, 4, 11, 12])
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2-'])
-    assert result.exit_code == 2
+    run(delete, input_file=TEST_FILE, output=test_out, select_pages={0, 4, 5, 6, 7, 8, 9})
+    assert labels(read_out(test_out)) == page_names([2, 3, 4, 11, 12])
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1'])
-    assert result.exit_code == 0
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2,3'])
-    assert result.exit_code == 0
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-2'])
-    assert result.exit_code == 0
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-2,4-5'])
-    assert result.exit_code == 0
+    run_expect_error(delete, [TEST_FILE, '-o', test_out, '-p', '1-12'])
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,3-5'])
-    assert result.exit_code == 0
+    run_expect_error(delete, [TEST_FILE, '-o', test_out, '-p', '1,2-12'])
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-3,5'])
-    assert result.exit_code == 0
-    
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,3-5,7'])
-    assert result.exit_code == 0
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-3,5,7-9'])
-    assert result.exit_code == 0
-
-def test_delete():
+def test_extract(test_out):
     # result.exit_code = 0 -> okay
     # result.exit_code = 2 -> error raised
 
-    RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res_reader.pages)):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 2}')
+    run(extract, input_file=TEST_FILE, output=test_out, select_pages={0})
+    assert labels(read_out(test_out)) == page_names([1])
 
-    RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2,3,4'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res_reader.pages)):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 5}')
+    run(extract, input_file=TEST_FILE, output=test_out, select_pages={0, 1, 2, 3})
+    assert labels(read_out(test_out)) == page_names(range(1, 5))
 
-    RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '10-12'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res_reader.pages)):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
+    run(extract, input_file=TEST_FILE, output=test_out, select_pages={9, 10, 11})
+    assert labels(read_out(test_out)) == page_names(range(10, 13))
 
-    RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2,3,4,10-12'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res_reader.pages)):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 5}')
+    run(extract, input_file=TEST_FILE, output=test_out, select_pages={0, 1, 2, 3, 9, 10, 11})
+    assert labels(read_out(test_out)) == page_names([1, 2, 3, 4, 10, 11, 12])
 
-    RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '5-10'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(4):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(4, 6):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 7}')
+    run(extract, input_file=TEST_FILE, output=test_out, select_pages={0, 4, 5, 6, 7, 8, 9})
+    assert labels(read_out(test_out)) == page_names([1, 5, 6, 7, 8, 9, 10])
 
-    RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,5-10'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(3):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 2}')
-    for i in range(3, 5):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 8}')
+    run_expect_error(extract, [TEST_FILE, '-o', test_out, '-p', '1-12'])
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1-12'])
-    assert result.exit_code == 2
+    run_expect_error(extract, [TEST_FILE, '-o', test_out, '-p', '1,2-12'])
 
-    result = RUNNER.invoke(delete, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2-12'])
-    assert result.exit_code == 2
 
+def test_insert(test_out):
+    run(insert, input_files=(TEST_FILE, TEST_FILE), output=test_out, select_pages={0})
+    assert labels(read_out(test_out)) == page_names(range(1, 13)) * 2
+    
+    run(insert, input_files=(TEST_FILE, TEST_FILE), output=test_out, select_pages={0, 1, 2, 3, 4})
+    assert labels(read_out(test_out)) == page_names(range(1, 13)) * 2
 
-def test_extract():
-    # result.exit_code = 0 -> okay
-    # result.exit_code = 2 -> error raised
+    run(insert, input_files=(TEST_FILE, TEST_FILE), output=test_out, select_pages={5})
+    assert labels(read_out(test_out)) == page_names([*range(1, 6), *range(1, 13), *range(6, 13)])
 
-    RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '1'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    assert len(res_reader.pages) == 1
-    assert res_reader.pages[0].extract_text().startswith('page1')
-
-    RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2,3,4'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    assert len(res_reader.pages) == 4
-    for i in range(len(res_reader.pages)):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-
-    RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '10-12'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    assert len(res_reader.pages) == 3
-    for i in range(len(res_reader.pages)):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 10}')
-
-    RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2,3,4,10-12'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    assert len(res_reader.pages) == 7
-    for i in range(4):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(4, 7):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 6}')
-
-    RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '1,5-10'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    assert len(res_reader.pages) == 7
-    assert res_reader.pages[0].extract_text().startswith('page1')
-    for i in range(1, 7):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 4}')
-
-    result = RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '1-12'])
-    assert result.exit_code == 2
-
-    result = RUNNER.invoke(extract, [TEST_FILE, '-o', TEST_OUT, '-p', '1,2-12'])
-    assert result.exit_code == 2
-
-
-def test_insert():
-    RUNNER.invoke(insert, [TEST_FILE, TEST_FILE, '-o', TEST_OUT, '-p', '1'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(0, 12):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(12, 24):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 11}')
-    
-    RUNNER.invoke(insert, [TEST_FILE, TEST_FILE, '-o', TEST_OUT, '-p', '1,2-5'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(0, 12):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(12, 24):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 11}')
-
-    RUNNER.invoke(insert, [TEST_FILE, TEST_FILE, '-o', TEST_OUT, '-p', '13'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(0, 12):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(12, 24):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 11}')
-
-    RUNNER.invoke(insert, [TEST_FILE, TEST_FILE, '-o', TEST_OUT, '-p', '6'])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(0, 5):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(5, 17):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 4}')
-    for i in range(17, 24):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 11}')
-
-
-def test_merge():
+    run_expect_error(insert, [TEST_FILE, TEST_FILE, '-o', test_out, '-p', '13'])
+
+
+def test_merge(test_out):
     # result.exit_code = 0 -> okay
     # result.exit_code = 2 -> error raised
 
-    RUNNER.invoke(merge, [TEST_FILE, TEST_FILE, '-o', TEST_OUT])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(0, 12):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(12, 24):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 11}')
-
-    RUNNER.invoke(merge, [TEST_FILE, TEST_FILE, TEST_FILE, '-o', TEST_OUT])
-    res_reader = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(0, 12):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i + 1}')
-    for i in range(12, 24):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 11}')
-    for i in range(24, 36):
-        assert res_reader.pages[i].extract_text().startswith(f'page{i - 23}')
-
-    result = RUNNER.invoke(merge, [TEST_FILE, '-o', TEST_OUT])
-    assert result.exit_code == 2
+    run(merge, input_files=(TEST_FILE, TEST_FILE), output=test_out)
+    assert labels(read_out(test_out)) == page_names(range(1, 13)) * 2
+
+    run(merge, input_files=(TEST_FILE, TEST_FILE, TEST_FILE), output=test_out)
+    assert labels(read_out(test_out)) == page_names(range(1, 13)) * 3
+
+    run_expect_error(merge, [TEST_FILE, '-o', test_out])
+
+    # annotations are kept unless only the pages are merged
+    annotated = test_out[:-4] + '_annotated.pdf'
+    writer = PdfWriter()
+    writer.add_blank_page(100, 100)
+    writer.add_annotation(0, DictionaryObject({
+        NameObject('/Type'): NameObject('/Annot'),
+        NameObject('/Subtype'): NameObject('/Text'),
+        NameObject('/Rect'): ArrayObject([NumberObject(10), NumberObject(10), NumberObject(20), NumberObject(20)]),
+    }))
+    write(writer, annotated)
+
+    run(merge, input_files=(annotated, annotated), output=test_out)
+    assert all('/Annots' in page for page in read_out(test_out).pages)
+
+    run(merge, input_files=(annotated, annotated), output=test_out, pages_only=True)
+    assert not any('/Annots' in page for page in read_out(test_out).pages)
 
     # I'm sorry but testing merge without input files / merge --all for merging 
     # all files in a current directory is a nightmare because testing with
@@ -322,41 +362,50 @@ def test_merge():
     # making test cases for merge all manual anyway. Too much of a headache.
 
 
-def test_split():
-    RUNNER.invoke(split, [TEST_FILE, '-o', TEST_OUT, '-p', '3'])
-    test_out_base = TEST_OUT[:-4]
-    res1 = PdfReader(open(test_out_base + '_1.pdf', 'rb'))
-    for i in range(0, 3):
-        assert res1.pages[i].extract_text().startswith(f'page{i + 1}')
-    res2 = PdfReader(open(test_out_base + '_2.pdf', 'rb'))
-    for i in range(0, 9):
-        assert res2.pages[i].extract_text().startswith(f'page{i + 4}')
-
-    RUNNER.invoke(split, [TEST_FILE, '-o', TEST_OUT, '-p', '3,9'])
-    test_out_base = TEST_OUT[:-4]
-    res1 = PdfReader(open(test_out_base + '_1.pdf', 'rb'))
-    for i in range(0, 3):
-        assert res1.pages[i].extract_text().startswith(f'page{i + 1}')
-    res2 = PdfReader(open(test_out_base + '_2.pdf', 'rb'))
-    for i in range(0, 6):
-        assert res2.pages[i].extract_text().startswith(f'page{i + 4}')
-    res3 = PdfReader(open(test_out_base + '_3.pdf', 'rb'))
-    for i in range(0, 3):
-        assert res3.pages[i].extract_text().startswith(f'page{i + 10}')
-
-    RUNNER.invoke(split, [TEST_FILE, '-o', TEST_OUT, '-a'])
-    test_out_base = TEST_OUT[:-4]
-    for i in range(1, 13):
-        res = PdfReader(open(test_out_base + f'_{buffer_number(2, i)}.pdf', 'rb'))
-        assert res.pages[0].extract_text().startswith(f'page{i}')
-
-    result = RUNNER.invoke(split, [test_out_base + '_01.pdf', '-o', TEST_OUT, '-p', '1'])
-    assert result.exit_code == 2
-
-
-def test_encrypt():
-    RUNNER.invoke(encrypt, [TEST_FILE, '-o', TEST_OUT, '--user-password', '1234', '--owner-password', 'abcd'])
-    res = PdfReader(open(TEST_OUT, 'rb'))
+def test_split(test_out):
+    test_out_base = test_out[:-4]
+    part_paths = tuple(f'{test_out_base}_{k}.pdf' for k in range(1, 4))
+    split_paths = tuple(f'{test_out_base}_{name}.pdf' for name in SPLIT_NAMES)
+
+    run(split, input_file=TEST_FILE, output=test_out, select_pages={2})
+    assert labels(read_out(part_paths[0])) == page_names(range(1, 4))
+    assert labels(read_out(part_paths[1])) == page_names(range(4, 13))
+
+    run(split, input_file=TEST_FILE, output=test_out, select_pages={2, 8})
+    assert labels(read_out(part_paths[0])) == page_names(range(1, 4))
+    assert labels(read_out(part_paths[1])) == page_names(range(4, 10))
+    assert labels(read_out(part_paths[2])) == page_names(range(10, 13))
+
+    run(split, input_file=TEST_FILE, output=test_out, all=True)
+    assert [labels(read_out(path)) for path in split_paths] == [[name] for name in page_names(range(1, 13))]
+
+    run_expect_error(split, [split_paths[0], '-o', test_out, '-p', '1'])
+
+
+def test_split_parallel(test_out, monkeypatch):
+    # force the process pool even on single cpu machines
+    monkeypatch.setattr('pypdf_cli.get_max_workers', lambda n_tasks: 2)
+    test_out_base = test_out[:-4]
+
+    run(split, input_file=TEST_FILE, output=test_out, select_pages={2, 8})
+    assert labels(read_out(f'{test_out_base}_1.pdf')) == page_names(range(1, 4))
+    assert labels(read_out(f'{test_out_base}_2.pdf')) == page_names(range(4, 10))
+    assert labels(read_out(f'{test_out_base}_3.pdf')) == page_names(range(10, 13))
+
+    run(split, input_file=TEST_FILE, output=test_out, all=True)
+    split_paths = [f'{test_out_base}_{name}.pdf' for name in SPLIT_NAMES]
+    assert [labels(read_out(path)) for path in split_paths] == [[name] for name in page_names(range(1, 13))]
+
+
+@pytest.fixture(scope='module')
+def encrypted_pdf(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('encrypted') / 'encrypted.pdf')
+    run(encrypt, input_file=TEST_FILE, output=path, user_password='1234', owner_password='abcd')
+    return path
+
+
+def test_encrypt(encrypted_pdf):
+    res = read_out(encrypted_pdf)
     assert res.is_encrypted
     with pytest.raises(PdfReadError):
         res.pages[0]
@@ -366,97 +415,86 @@ def test_encrypt():
     assert len(res.pages) == 12
 
 
-def test_decrypt():
-    test_out_encrypted = TEST_OUT[:-4] + '_encrypted.pdf'
-    RUNNER.invoke(encrypt, [TEST_FILE, '-o', test_out_encrypted, '--user-password', '1234', '--owner-password', 'abcd'])
-
-    RUNNER.invoke(decrypt, [test_out_encrypted, '-o', TEST_OUT, '--password', '1234'])
-    res = PdfReader(open(TEST_OUT, 'rb'))
+def test_decrypt(encrypted_pdf, test_out):
+    run(decrypt, input_file=encrypted_pdf, output=test_out, password='1234')
+    res = read_out(test_out)
     assert not res.is_encrypted
 
-    RUNNER.invoke(decrypt, [test_out_encrypted, '-o', TEST_OUT, '--password', 'abcd'])
-    res = PdfReader(open(TEST_OUT, 'rb'))
+    run(decrypt, input_file=encrypted_pdf, output=test_out, password='abcd')
+    res = read_out(test_out)
     assert not res.is_encrypted
 
-    result = RUNNER.invoke(decrypt, [test_out_encrypted, '-o', TEST_OUT, '--password', 'wrong pw'])
-    assert result.exit_code == 2
+    # decrypting must not leave a decrypted reader behind for later commands
+    with pytest.raises(PdfReadError):
+        run(extract, input_file=encrypted_pdf, output=test_out, select_pages={0})
+
+    run_expect_error(decrypt, [encrypted_pdf, '-o', test_out, '--password', 'wrong pw'])
 
-    result = RUNNER.invoke(decrypt, [TEST_FILE, '-o', TEST_OUT, '--password', 'wrong pw'])
-    assert result.exit_code == 2
+    run_expect_error(decrypt, [TEST_FILE, '-o', test_out, '--password', 'wrong pw'])
 
+    # owner-only encryption uses an empty user password
+    owner_only = test_out[:-4] + '_owner_only.pdf'
+    run(encrypt, input_file=TEST_FILE, output=owner_only, user_password='', owner_password='abcd')
+    run(decrypt, input_file=owner_only, output=test_out, password='')
+    assert not read_out(test_out).is_encrypted
 
-def test_remove():
-    result = RUNNER.invoke(remove, [TEST_FILE, '-o', TEST_OUT])
-    assert result.exit_code == 2
 
-    RUNNER.invoke(remove, [TEST_FILE, '-o', TEST_OUT, '--text'])
-    res = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res.pages)):
-        assert res.pages[i].extract_text().strip() == ''
+def test_remove(test_out):
+    run_expect_error(remove, [TEST_FILE, '-o', test_out])
+
+    run(remove, input_file=TEST_FILE, output=test_out, text=True)
+    res = read_out(test_out)
+    assert len(res.pages) == 12
+    for page in res.pages:
+        assert page.extract_text().strip() == ''
 
     # I don't know how to test removal of images and links
     # pypdf doesn't appear to have a high level api for that
 
 
 def test_info():
-    result = RUNNER.invoke(info, [TEST_FILE])
+    result = RUNNER.invoke(info, [TEST_FILE], catch_exceptions=False)
     assert result.exit_code == 0
     assert len(result.output) > 0
 
     # not sure how to test the content of the document info
 
 
-def test_reverse():
-    RUNNER.invoke(reverse, [TEST_FILE, '-o', TEST_OUT])
-    res = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res.pages)):
-        assert res.pages[i].extract_text().startswith(f'page{12 - i}')
-
-
-def test_rotate():
-    RUNNER.invoke(rotate, [TEST_FILE, '-o', TEST_OUT, '-a', '--angle', 90])
-    res = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res.pages)):
-        page = res.pages[i]
-        rotate_obj = page.get("/Rotate", 0)
-        current_angle = rotate_obj if isinstance(rotate_obj, int) else rotate_obj.getObject()
-        assert current_angle == 90
-
-    RUNNER.invoke(rotate, [TEST_FILE, '-o', TEST_OUT, '-a', '--angle', -90])
-    res = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(len(res.pages)):
-        page = res.pages[i]
-        rotate_obj = page.get("/Rotate", 0)
-        current_angle = rotate_obj if isinstance(rotate_obj, int) else rotate_obj.getObject()
-        assert current_angle == -90
-
-    RUNNER.invoke(rotate, [TEST_FILE, '-o', TEST_OUT, '-p', '1-6', '--angle', 90])
-    res = PdfReader(open(TEST_OUT, 'rb'))
-    for i in range(6):
-        page = res.pages[i]
-        rotate_obj = page.get("/Rotate", 0)
-        current_angle = rotate_obj if isinstance(rotate_obj, int) else rotate_obj.getObject()
-        assert current_angle == 90
-    for i in range(6, 12):
-        page = res.pages[i]
-        rotate_obj = page.get("/Rotate", 0)
-        current_angle = rotate_obj if isinstance(rotate_obj, int) else rotate_obj.getObject()
-        assert current_angle == 0
-
-    result = RUNNER.invoke(rotate, [TEST_FILE, '-o', TEST_OUT, '-a', '--angle', 45])
-    assert result.exit_code == 2
-
-
-def test_scale():
-    result = RUNNER.invoke(scale, [TEST_FILE, '-o', TEST_OUT, '-a', '--vertical', 2.0, '--horizontal', 2.0])
-    assert result.exit_code == 0
+def test_reverse(test_out):
+    run(reverse, input_file=TEST_FILE, output=test_out)
+    assert labels(read_out(test_out)) == page_names(range(12, 0, -1))
 
-    result = RUNNER.invoke(scale, [TEST_FILE, '-o', TEST_OUT, '-p', '1-6', '--vertical', 2.0, '--horizontal', 2.0])
-    assert result.exit_code == 0
 
-    result = RUNNER.invoke(scale, [TEST_FILE, '-o', TEST_OUT, '-a', '--vertical', 256.0, '--horizontal', 256.0,
-                                   '--scale-to'])
-    assert result.exit_code == 0
+def test_rotate(test_out, capsys):
+    run(rotate, input_file=TEST_FILE, output=test_out, all=True, angle=90)
+    assert angles(read_out(test_out)) == [90] * 12
+
+    run(rotate, input_file=TEST_FILE, output=test_out, all=True, angle=-90)
+    assert angles(read_out(test_out)) == [270] * 12
+
+    run(rotate, input_file=TEST_FILE, output=test_out, select_pages={0, 1, 2, 3, 4, 5}, angle=90)
+    assert angles(read_out(test_out)) == [90] * 6 + [0] * 6
+
+    run_expect_error(rotate, [TEST_FILE, '-o', test_out, '-a', '--angle', 45])
+
+    run(rotate, input_file=TEST_FILE, output=test_out, all=True, angle=360)
+    assert 'No-op rotation' in capsys.readouterr().out
+    assert angles(read_out(test_out)) == [0] * 12
+
+    run_expect_error(rotate, [TEST_FILE, '-o', test_out, '-p', '1000', '--angle', 360])
+
+    run_expect_error(rotate, [TEST_FILE, '-o', test_out, '--angle', 0])
+
+
+def test_scale(test_out):
+    run(scale, input_file=TEST_FILE, output=test_out, all=True, vertical=2.0, horizontal=2.0)
+    assert len(read_out(test_out).pages) == 12
+
+    run(scale, input_file=TEST_FILE, output=test_out, select_pages={0, 1, 2, 3, 4, 5}, vertical=2.0, horizontal=2.0)
+    assert len(read_out(test_out).pages) == 12
+
+    run(scale, input_file=TEST_FILE, output=test_out, all=True, vertical=256.0, horizontal=256.0, scale_to=True)
+    assert len(read_out(test_out).pages) == 12
 
     # I don't know how to test the size of pages
     # pypdf doesn't appear to have a high level api for that